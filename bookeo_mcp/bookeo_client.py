@@ -1,64 +1,275 @@
 """Async Bookeo API client with rate limiting and pagination."""
 
 import asyncio
+import functools
+import json
 import os
+import random
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import AsyncGenerator, Optional
+from itertools import islice
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+from urllib.parse import urlencode
 from zoneinfo import ZoneInfo
 
 import httpx
 from dotenv import load_dotenv
 
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 load_dotenv()
 
+# Dates are interpreted in the business's local timezone, then sent to Bookeo as UTC
+_LOCAL_TZ = ZoneInfo(os.getenv("BOOKEO_LOCAL_TZ", "America/Los_Angeles"))
+_UTC_TZ = ZoneInfo("UTC")
+
+# Bookeo limits booking searches to 30-day windows
+_CHUNK = timedelta(days=30)
+
+# Sentinel pushed by a page producer once its chunk is exhausted
+_PAGES_DONE = object()
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter."""
+
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_per_sec)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until `tokens` are available, then consume them."""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.refill_per_sec)
+                self._refill()
+            self._tokens -= tokens
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the server signals a rate limit."""
+        self._tokens = 0
+        self._updated = time.monotonic()
+
+
+class AsyncTTLCache:
+    """LRU cache for async lookups with per-entry expiry.
+
+    Concurrent callers for the same key share a single in-flight fetch.
+    Exceptions are not cached, and expired entries are dropped when read.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._locks: dict = {}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def get(self, key, fetch: Callable[[], Awaitable]):
+        """Return the cached value for key, calling fetch() on a miss."""
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[1]
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        async with lock:
+            # Another caller may have filled the entry while we waited
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry[1]
+
+            try:
+                value = await fetch()
+            finally:
+                self._locks.pop(key, None)
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return value
+
 
 class BookeoClient:
     """Async Bookeo API client with rate limiting and pagination."""
 
     BASE_URL = "https://api.bookeo.com/v2"
+    # Every API request takes a token. Bookeo doesn't document a per-second
+    # limit, so this is sized to leave a serial page-by-page scan (one request
+    # per round trip) effectively unthrottled; 429s drain the bucket.
+    RATE_LIMIT_BURST = 10
+    RATE_LIMIT_PER_SEC = 5.0
+    # Retry policy for 429 and 5xx responses
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1.0
+    BACKOFF_MAX = 30.0
+    # Number of 30-day chunks paginated concurrently by search_bookings. All
+    # requests share the token bucket, so two streams are enough to overlap
+    # round trips up to the rate limit without adding to it.
+    CHUNK_CONCURRENCY = 2
+    # Responses larger than this many bytes are JSON-decoded off the event loop
+    THREADED_DECODE_THRESHOLD = 65536
 
     def __init__(self):
         self.api_key = os.getenv("API_KEY")
         self.api_secret = os.getenv("API_SECRET")
         if not self.api_key or not self.api_secret:
             raise ValueError("API_KEY and API_SECRET must be set in .env")
+        self._auth_query = urlencode(
+            {"apiKey": self.api_key, "secretKey": self.api_secret}
+        )
+        # Authenticated base URL per endpoint, bounded since endpoints include
+        # booking numbers and chunk queries
+        self._auth_url = functools.lru_cache(maxsize=256)(self._build_auth_url)
         self._client: Optional[httpx.AsyncClient] = None
+        self._bucket = TokenBucket(self.RATE_LIMIT_BURST, self.RATE_LIMIT_PER_SEC)
+        self._booking_cache = AsyncTTLCache(maxsize=512, ttl=60)
+        self._payments_cache = AsyncTTLCache(maxsize=512, ttl=60)
 
     async def _get_client(self) -> httpx.AsyncClient:
         if self._client is None:
-            self._client = httpx.AsyncClient(timeout=30.0)
+            # Pagination hits the same host repeatedly; keep connections alive
+            # so page requests reuse the TCP/TLS session instead of reconnecting.
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=100,
+                    keepalive_expiry=30.0,
+                ),
+                headers={"Accept-Encoding": "gzip, br"},
+            )
         return self._client
 
+    def _build_auth_url(self, endpoint: str) -> httpx.URL:
+        """Build the URL for an endpoint with the auth params appended."""
+        sep = "&" if "?" in endpoint else "?"
+        return httpx.URL(f"{self.BASE_URL}{endpoint}{sep}{self._auth_query}")
+
     async def _request(self, endpoint: str, params: Optional[dict] = None) -> dict:
         """Make authenticated request with rate limiting."""
         client = await self._get_client()
-        params = params or {}
-        params["apiKey"] = self.api_key
-        params["secretKey"] = self.api_secret
 
-        url = f"{self.BASE_URL}{endpoint}"
+        # Append the caller's params to the cached, already-encoded base query
+        # rather than merging, which would decode and re-encode all of it.
+        # The caller's dict isn't mutated, and retries reuse the same URL.
+        url = self._auth_url(endpoint)
+        if params:
+            url = url.copy_with(query=url.query + b"&" + urlencode(params).encode())
+
+        for attempt in range(self.MAX_RETRIES + 1):
+            await self._bucket.acquire()
+            response = await client.get(url)
 
-        while True:
-            response = await client.get(url, params=params)
+            if attempt < self.MAX_RETRIES:
+                if response.status_code == 429:
+                    # Jitter so concurrent callers don't all retry at the same instant
+                    retry_after = int(response.headers.get("Retry-After", 60))
+                    self._bucket.drain()
+                    await asyncio.sleep(
+                        retry_after + random.uniform(0, min(retry_after, 5))
+                    )
+                    continue
 
-            if response.status_code == 429:
-                retry_after = int(response.headers.get("Retry-After", 60))
-                await asyncio.sleep(retry_after)
-                continue
+                if response.status_code >= 500:
+                    await asyncio.sleep(
+                        min(self.BACKOFF_BASE * 2**attempt, self.BACKOFF_MAX)
+                    )
+                    continue
 
-            response.raise_for_status()
-            return response.json()
+            break
+
+        response.raise_for_status()
+
+        # Decode large pages in a worker thread so they don't block the event loop
+        raw = response.content
+        if len(raw) > self.THREADED_DECODE_THRESHOLD:
+            return await asyncio.to_thread(_json_loads, raw)
+        return _json_loads(raw)
 
     async def get_booking(self, booking_number: str) -> dict:
         """Get a single booking by number."""
-        return await self._request(
-            f"/bookings/{booking_number}", {"expandCustomer": "true"}
+        return await self._booking_cache.get(
+            booking_number,
+            lambda: self._request(
+                f"/bookings/{booking_number}", {"expandCustomer": "true"}
+            ),
         )
 
     async def get_booking_payments(self, booking_number: str) -> list:
         """Get payments for a specific booking."""
-        data = await self._request(f"/bookings/{booking_number}/payments")
-        return data.get("data", [])
+
+        async def fetch() -> list:
+            data = await self._request(f"/bookings/{booking_number}/payments")
+            return data.get("data", [])
+
+        return await self._payments_cache.get(booking_number, fetch)
+
+    async def _fetch_pages(self, base_query: str, queue: asyncio.Queue) -> None:
+        """Fetch every page of a single chunk, pushing each page's bookings to queue."""
+        endpoint = f"/bookings?{base_query}"
+        page_token = None
+        page_number = 1
+
+        try:
+            while True:
+                # Only the paging params change between pages
+                params = {}
+
+                if page_token:
+                    params["pageNavigationToken"] = page_token
+                    params["pageNumber"] = page_number
+
+                data = await self._request(endpoint, params)
+                paging = data.get("info", {}).get("paging", {})
+
+                # If Bookeo serves a different page than requested, paging has
+                # stalled; following nextPageURL would repeat pages forever
+                current_page = paging.get("currentPage")
+                if current_page is not None and current_page != page_number:
+                    raise RuntimeError(
+                        f"Bookeo returned page {current_page} "
+                        f"when page {page_number} was requested"
+                    )
+
+                await queue.put(data.get("data", []))
+
+                if not paging.get("nextPageURL"):
+                    break
+
+                page_token = paging.get("pageNavigationToken")
+                page_number += 1
+        except Exception as e:
+            await queue.put(e)
+        else:
+            await queue.put(_PAGES_DONE)
 
     async def search_bookings(
         self,
@@ -68,53 +279,67 @@ class BookeoClient:
         include_canceled: bool = False,
     ) -> AsyncGenerator[dict, None]:
         """Search bookings with automatic pagination and 30-day chunking."""
-        # Use local timezone (Pacific) for date interpretation, convert to UTC for API
-        local_tz = ZoneInfo("America/Los_Angeles")
-        utc_tz = ZoneInfo("UTC")
+        expand_str = str(expand_customer).lower()
+        cancel_str = str(include_canceled).lower()
 
+        chunk_queries = []
         current_start = start_time
 
         while current_start < end_time:
-            chunk_end = min(current_start + timedelta(days=30), end_time)
+            chunk_end = min(current_start + _CHUNK, end_time)
 
             # Convert local dates to UTC for Bookeo API
             # Start at midnight local time, end at 23:59:59 local time
-            start_local = current_start.replace(hour=0, minute=0, second=0, tzinfo=local_tz)
-            end_local = chunk_end.replace(hour=23, minute=59, second=59, tzinfo=local_tz)
+            start_local = current_start.replace(hour=0, minute=0, second=0, tzinfo=_LOCAL_TZ)
+            end_local = chunk_end.replace(hour=23, minute=59, second=59, tzinfo=_LOCAL_TZ)
 
-            start_utc = start_local.astimezone(utc_tz)
-            end_utc = end_local.astimezone(utc_tz)
+            start_utc = start_local.astimezone(_UTC_TZ)
+            end_utc = end_local.astimezone(_UTC_TZ)
 
-            page_token = None
-            page_number = None
+            # Constant for every page of this chunk, so encode once
+            chunk_queries.append(
+                urlencode(
+                    {
+                        "startTime": f"{start_utc:%Y-%m-%dT%H:%M:%SZ}",
+                        "endTime": f"{end_utc:%Y-%m-%dT%H:%M:%SZ}",
+                        "itemsPerPage": 100,
+                        "expandCustomer": expand_str,
+                        "includeCanceled": cancel_str,
+                    }
+                )
+            )
 
-            while True:
-                params = {
-                    "startTime": start_utc.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                    "endTime": end_utc.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                    "itemsPerPage": 100,
-                    "expandCustomer": str(expand_customer).lower(),
-                    "includeCanceled": str(include_canceled).lower(),
-                }
+            current_start = chunk_end
 
-                if page_token:
-                    params["pageNavigationToken"] = page_token
-                    params["pageNumber"] = page_number
+        # Keep up to CHUNK_CONCURRENCY chunks fetching ahead, each prefetching
+        # into its own queue, but drain the queues in chunk order so bookings
+        # come out chronologically.
+        pending: deque = deque()
+        queries = iter(chunk_queries)
 
-                data = await self._request("/bookings", params)
+        def start_chunks() -> None:
+            for base_query in islice(queries, self.CHUNK_CONCURRENCY - len(pending)):
+                queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+                producer = asyncio.create_task(self._fetch_pages(base_query, queue))
+                pending.append((queue, producer))
 
-                for booking in data.get("data", []):
+        try:
+            start_chunks()
+            while pending:
+                page = await pending[0][0].get()
+                if page is _PAGES_DONE:
+                    pending.popleft()
+                    start_chunks()
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                for booking in page:
                     yield booking
-
-                paging = data.get("info", {}).get("paging", {})
-                if paging.get("nextPageURL"):
-                    page_token = paging.get("pageNavigationToken")
-                    page_number = paging.get("currentPage", 1) + 1
-                else:
-                    break
-
-            current_start = chunk_end
-            await asyncio.sleep(0.5)  # Rate limit courtesy
+        finally:
+            producers = [producer for _, producer in pending]
+            for producer in producers:
+                producer.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
 
     async def close(self):
         if self._client:
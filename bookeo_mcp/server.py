@@ -2,14 +2,17 @@
 
 import argparse
 import os
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from mcp.server.fastmcp import FastMCP
 from mcp.server.transport_security import TransportSecuritySettings
+from starlette.applications import Starlette
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.routing import Mount
 
 from .bookeo_client import BookeoClient
 
@@ -41,7 +44,38 @@ def get_transport_security() -> TransportSecuritySettings:
         )
 
 
-mcp = FastMCP("Bookeo", transport_security=get_transport_security())
+# One Bookeo client per process, so every MCP session shares its connection
+# pool and caches. Reference-counted so nested lifespans reuse it.
+_client: Optional[BookeoClient] = None
+_client_users = 0
+
+
+@asynccontextmanager
+async def bookeo_client_lifespan() -> AsyncIterator[BookeoClient]:
+    """Hold the process-wide Bookeo client, creating it for the first user."""
+    global _client, _client_users
+    if _client is None:
+        _client = BookeoClient()
+    _client_users += 1
+    try:
+        yield _client
+    finally:
+        _client_users -= 1
+        if _client_users == 0:
+            await _client.close()
+            _client = None
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[dict]:
+    """FastMCP lifespan; keeps the Bookeo client open in every run mode."""
+    async with bookeo_client_lifespan() as client:
+        yield {"client": client}
+
+
+mcp = FastMCP(
+    "Bookeo", lifespan=lifespan, transport_security=get_transport_security()
+)
 
 
 class BearerTokenAuthMiddleware(BaseHTTPMiddleware):
@@ -102,44 +136,41 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
-_client: Optional[BookeoClient] = None
-
-
-def get_client() -> BookeoClient:
-    global _client
+def shared_client() -> BookeoClient:
+    """Return the process-wide Bookeo client."""
     if _client is None:
-        _client = BookeoClient()
+        raise RuntimeError("Bookeo client is not running")
     return _client
 
 
-def format_customer(booking: dict) -> dict:
-    """Extract customer info from booking."""
+def project_booking(booking: dict) -> dict:
+    """Build the booking summary shared by the booking tools in one pass."""
     customer = booking.get("customer", {})
     phone_numbers = customer.get("phoneNumbers", [])
-    return {
-        "name": f"{customer.get('firstName', '')} {customer.get('lastName', '')}".strip(),
-        "email": customer.get("emailAddress", ""),
-        "phone": phone_numbers[0].get("number", "") if phone_numbers else "",
-    }
-
-
-def format_price(booking: dict) -> dict:
-    """Extract price info from booking."""
     price = booking.get("price", {})
+    numbers = booking.get("participants", {}).get("numbers", [])
+    try:
+        participants = sum(p["number"] for p in numbers)
+    except KeyError:
+        participants = sum(p.get("number", 0) for p in numbers)
     return {
-        "total_gross": price.get("totalGross", {}),
-        "total_paid": price.get("totalPaid", {}),
-        "balance_due": price.get("balanceDue", {}),
+        "booking_number": booking.get("bookingNumber"),
+        "start_time": booking.get("startTime"),
+        "product_name": booking.get("productName"),
+        "customer": {
+            "name": f"{customer.get('firstName', '')} {customer.get('lastName', '')}".strip(),
+            "email": customer.get("emailAddress", ""),
+            "phone": phone_numbers[0].get("number", "") if phone_numbers else "",
+        },
+        "participants": participants,
+        "price": {
+            "total_gross": price.get("totalGross", {}),
+            "total_paid": price.get("totalPaid", {}),
+            "balance_due": price.get("balanceDue", {}),
+        },
     }
 
 
-def format_participants(booking: dict) -> int:
-    """Extract participant count."""
-    participants = booking.get("participants", {})
-    numbers = participants.get("numbers", [])
-    return sum(p.get("number", 0) for p in numbers)
-
-
 def analyze_payment(payment: dict) -> dict:
     """Analyze a single payment for method and gateway."""
     gateway = payment.get("gatewayName", "")
@@ -148,6 +179,7 @@ def analyze_payment(payment: dict) -> dict:
         "method": payment.get("paymentMethod", "unknown"),
         "gateway": gateway if gateway else "manual",
         "is_manual": not bool(gateway),
+        "is_stripe": "stripe" in (gateway or "").lower(),
         "reason": payment.get("reason", ""),
         "agent": payment.get("agent", ""),
         "received_time": payment.get("receivedTime", ""),
@@ -156,7 +188,10 @@ def analyze_payment(payment: dict) -> dict:
 
 @mcp.tool()
 async def search_bookings_by_customer(
-    customer_name: str = "", customer_email: str = "", days_back: int = 90
+    customer_name: str = "",
+    customer_email: str = "",
+    days_back: int = 90,
+    limit: int = 0,
 ) -> list[dict]:
     """
     Search for bookings by customer name or email.
@@ -165,6 +200,7 @@ async def search_bookings_by_customer(
         customer_name: Full or partial customer name to search for (case-insensitive)
         customer_email: Full or partial email address to search for (case-insensitive)
         days_back: How many days back to search (default 90, max 365)
+        limit: Stop after this many matches (default 0, no limit)
 
     Returns:
         List of matching bookings with customer info, dates, and product details
@@ -172,9 +208,12 @@ async def search_bookings_by_customer(
     if not customer_name and not customer_email:
         return [{"error": "Must provide either customer_name or customer_email"}]
 
+    if limit < 0:
+        return [{"error": "limit cannot be negative"}]
+
     days_back = min(days_back, 365)
 
-    client = get_client()
+    client = shared_client()
     end_time = datetime.now()
     start_time = end_time - timedelta(days=days_back)
 
@@ -182,24 +221,25 @@ async def search_bookings_by_customer(
     name_lower = customer_name.lower() if customer_name else ""
     email_lower = customer_email.lower() if customer_email else ""
 
-    async for booking in client.search_bookings(start_time, end_time):
-        customer = format_customer(booking)
-
-        name_match = name_lower and name_lower in customer["name"].lower()
-        email_match = email_lower and email_lower in customer["email"].lower()
-
-        if name_match or email_match:
-            results.append(
-                {
-                    "booking_number": booking.get("bookingNumber"),
-                    "start_time": booking.get("startTime"),
-                    "product_name": booking.get("productName"),
-                    "customer": customer,
-                    "participants": format_participants(booking),
-                    "price": format_price(booking),
-                }
+    # aclosing stops the search as soon as we break out on the limit
+    async with aclosing(client.search_bookings(start_time, end_time)) as bookings:
+        async for booking in bookings:
+            # Match on the raw customer fields so non-matches skip formatting
+            customer = booking.get("customer", {})
+
+            name_match = False
+            if name_lower:
+                name = f"{customer.get('firstName', '')} {customer.get('lastName', '')}"
+                name_match = name_lower in name.strip().lower()
+            email_match = bool(email_lower) and (
+                email_lower in customer.get("emailAddress", "").lower()
             )
 
+            if name_match or email_match:
+                results.append(project_booking(booking))
+                if limit and len(results) >= limit:
+                    break
+
     return results
 
 
@@ -214,20 +254,14 @@ async def get_booking(booking_number: str) -> dict:
     Returns:
         Complete booking details including customer, pricing, and product info
     """
-    client = get_client()
-
     try:
+        client = shared_client()
         booking = await client.get_booking(booking_number)
 
         return {
-            "booking_number": booking.get("bookingNumber"),
-            "start_time": booking.get("startTime"),
+            **project_booking(booking),
             "end_time": booking.get("endTime"),
-            "product_name": booking.get("productName"),
             "product_id": booking.get("productId"),
-            "customer": format_customer(booking),
-            "participants": format_participants(booking),
-            "price": format_price(booking),
             "price_adjustments": booking.get("priceAdjustments", []),
             "creation_time": booking.get("creationTime"),
             "source": booking.get("source", {}),
@@ -261,22 +295,13 @@ async def search_bookings_by_date(
     if (end_time - start_time).days > 366:  # 366 because end_time has +1 day added
         return [{"error": "Date range cannot exceed 365 days"}]
 
-    client = get_client()
+    client = shared_client()
     results = []
 
     async for booking in client.search_bookings(
         start_time, end_time, include_canceled=include_canceled
     ):
-        results.append(
-            {
-                "booking_number": booking.get("bookingNumber"),
-                "start_time": booking.get("startTime"),
-                "product_name": booking.get("productName"),
-                "customer": format_customer(booking),
-                "participants": format_participants(booking),
-                "price": format_price(booking),
-            }
-        )
+        results.append(project_booking(booking))
 
     return results
 
@@ -292,25 +317,25 @@ async def get_booking_payments(booking_number: str) -> dict:
     Returns:
         Payment breakdown including methods, amounts, and manual vs Stripe detection
     """
-    client = get_client()
-
     try:
+        client = shared_client()
         payments = await client.get_booking_payments(booking_number)
 
         analyzed_payments = [analyze_payment(p) for p in payments]
 
-        total_paid = sum(
-            float(p["amount"].get("amount", 0) or 0) for p in analyzed_payments
-        )
+        # Aggregate totals and flags in a single pass over the payments
+        total_paid = 0.0
+        has_manual = False
+        has_stripe = False
+        # Plain dict as an insertion-ordered set of payment methods
+        methods = {}
+        for p in analyzed_payments:
+            total_paid += float(p["amount"].get("amount", 0) or 0)
+            has_manual = has_manual or p["is_manual"]
+            has_stripe = has_stripe or p["is_stripe"]
+            methods[p["method"]] = None
 
-        has_manual = any(p["is_manual"] for p in analyzed_payments)
-        has_stripe = any(
-            "stripe" in p["gateway"].lower()
-            for p in analyzed_payments
-            if p["gateway"]
-        )
-
-        payment_methods = list(set(p["method"] for p in analyzed_payments))
+        payment_methods = list(methods)
 
         return {
             "booking_number": booking_number,
@@ -332,7 +357,16 @@ async def get_booking_payments(booking_number: str) -> dict:
 
 def create_authenticated_app():
     """Create the Starlette app with authentication middleware."""
-    app = mcp.streamable_http_app()
+    mcp_app = mcp.streamable_http_app()
+
+    # FastMCP's lifespan runs once per session under streamable-http, so also
+    # hold the Bookeo client for the app's lifetime to share it across sessions
+    @asynccontextmanager
+    async def app_lifespan(app: Starlette) -> AsyncIterator[None]:
+        async with bookeo_client_lifespan(), mcp.session_manager.run():
+            yield
+
+    app = Starlette(routes=[Mount("/", app=mcp_app)], lifespan=app_lifespan)
     app.add_middleware(BearerTokenAuthMiddleware)
     return app
 
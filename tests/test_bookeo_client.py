@@ -0,0 +1,128 @@
+"""Tests for BookeoClient's chunked, concurrent booking search."""
+
+import asyncio
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from bookeo_mcp.bookeo_client import BookeoClient
+
+PAGES_PER_CHUNK = 3
+BOOKINGS_PER_PAGE = 2
+
+# Four 30-day chunks
+START = datetime(2024, 1, 1)
+END = datetime(2024, 4, 15)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("API_KEY", "key")
+    monkeypatch.setenv("API_SECRET", "secret")
+    return BookeoClient()
+
+
+def fake_bookings_api(delay=lambda chunk, page: 0, fail=lambda chunk, page: False):
+    """Build a _request stand-in serving PAGES_PER_CHUNK pages for each chunk."""
+
+    async def request(endpoint, params=None):
+        query = parse_qs(urlsplit(endpoint).query)
+        chunk = query["startTime"][0]
+        page = (params or {}).get("pageNumber", 1)
+        await asyncio.sleep(delay(chunk, page))
+        if fail(chunk, page):
+            raise RuntimeError(f"failed on {chunk} page {page}")
+        return {
+            "data": [
+                {"chunk": chunk, "page": page, "index": i}
+                for i in range(BOOKINGS_PER_PAGE)
+            ],
+            "info": {
+                "paging": {
+                    "currentPage": page,
+                    "pageNavigationToken": "token",
+                    "nextPageURL": "next" if page < PAGES_PER_CHUNK else None,
+                }
+            },
+        }
+
+    return request
+
+
+def other_tasks() -> set:
+    return asyncio.all_tasks() - {asyncio.current_task()}
+
+
+def test_chunks_are_yielded_in_chronological_order(client):
+    # The first chunk is the slowest, so later chunks finish first
+    first_chunk = "2024-01-01T08:00:00Z"
+    client._request = fake_bookings_api(
+        delay=lambda chunk, page: 0.02 if chunk == first_chunk else 0
+    )
+
+    async def run():
+        return [
+            (b["chunk"], b["page"], b["index"])
+            async for b in client.search_bookings(START, END)
+        ]
+
+    bookings = asyncio.run(run())
+
+    assert len(bookings) == 4 * PAGES_PER_CHUNK * BOOKINGS_PER_PAGE
+    assert bookings == sorted(bookings)
+    assert bookings[0][0] == first_chunk
+
+
+def test_producer_error_propagates_and_stops_other_chunks(client):
+    client._request = fake_bookings_api(
+        delay=lambda chunk, page: 0.01,
+        fail=lambda chunk, page: chunk.startswith("2024-01-31") and page == 2,
+    )
+
+    async def run():
+        with pytest.raises(RuntimeError, match="2024-01-31"):
+            async for _ in client.search_bookings(START, END):
+                pass
+        return other_tasks()
+
+    assert asyncio.run(run()) == set()
+
+
+def test_early_close_cancels_producers(client):
+    client._request = fake_bookings_api(delay=lambda chunk, page: 0.05)
+
+    async def run():
+        bookings = client.search_bookings(START, END)
+        first = await bookings.__anext__()
+        assert other_tasks()
+        await bookings.aclose()
+        return first, other_tasks()
+
+    first, remaining = asyncio.run(run())
+
+    assert first["page"] == 1
+    assert remaining == set()
+
+
+def test_stalled_paging_raises(client):
+    # A server that ignores the requested page and keeps serving page 1
+    async def request(endpoint, params=None):
+        return {
+            "data": [{"index": 0}],
+            "info": {
+                "paging": {
+                    "currentPage": 1,
+                    "pageNavigationToken": "token",
+                    "nextPageURL": "next",
+                }
+            },
+        }
+
+    client._request = request
+
+    async def run():
+        return [b async for b in client.search_bookings(START, END)]
+
+    with pytest.raises(RuntimeError, match="returned page 1 when page 2"):
+        asyncio.run(run())